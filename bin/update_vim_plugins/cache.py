@@ -0,0 +1,59 @@
+import atexit
+import json
+import os
+import threading
+
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "nixpkgs-vim-extra-plugins",
+)
+
+
+class JsonCache:
+    """A key-value cache that is persisted as a json file.
+
+    The file is read on first access and written back once when the interpreter exits.
+    Access is thread safe, so the cache can be shared by the update workers.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialize a JsonCache stored at path."""
+        self.path = path
+        self._data: dict | None = None
+        self._dirty = False
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def _load(self) -> dict:
+        if self._data is None:
+            try:
+                with open(self.path, "r") as file:
+                    self._data = json.load(file)
+            except (OSError, ValueError):
+                # a missing or broken cache is not an error, we just start over
+                self._data = {}
+        return self._data
+
+    def get(self, key: str, default=None):
+        """Return the cached value for key."""
+        with self._lock:
+            return self._load().get(key, default)
+
+    def set(self, key: str, value) -> None:
+        """Store value for key. Must be serializable to json."""
+        with self._lock:
+            self._load()[key] = value
+            self._dirty = True
+
+    def flush(self) -> None:
+        """Write the cache to disk, if anything changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(self._data, file)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
@@ -1,5 +1,10 @@
 from .spec import PluginSpec
 import yaml
+try:
+    # libyaml parses the manifest several times faster, fall back to the pure python loader without it
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 from pprint import pprint
 import subprocess
 from collections import defaultdict
@@ -24,7 +29,7 @@ PLUGINS_LIST_FILE = "./plugins.md"
 
 def read_manifest_yaml_to_spec() -> list[PluginSpec]:
     with open(MANIFEST_YAML, "r") as file:
-        data = yaml.safe_load(file)
+        data = yaml.load(file, Loader=SafeLoader)
 
     specs = [ PluginSpec.from_yaml(p) for p in data ]
 
@@ -38,7 +43,7 @@ def read_manifest_yaml_to_spec() -> list[PluginSpec]:
 
 def read_blocklist_yaml_to_spec() -> list[PluginSpec]:
     with open(BLOCKLIST_YAML, "r") as file:
-        data = yaml.safe_load(file) or []
+        data = yaml.load(file, Loader=SafeLoader) or []
 
     specs = [ PluginSpec.from_yaml(p) for p in data ]
 
@@ -56,15 +61,16 @@ def write_plugins_nix(plugins: list[VimPlugin]):
     header = "{ lib, buildVimPlugin, fetchurl, fetchgit }: {"
     footer = "}"
 
+    parts = [header]
+    for plugin in plugins:
+        try:
+            parts.append(f"{plugin.to_nix()}\n")
+        except Exception as e:
+            pass
+    parts.append(footer)
+
     with open(PKGS_FILE, "w") as file:
-        file.write(header)
-        for plugin in plugins:
-            try:
-                file.write(f"{plugin.to_nix()}\n")
-            except Exception as e:
-                pass
-
-        file.write(footer)
+        file.write("".join(parts))
 
 def format_nix_output():
     subprocess.run(
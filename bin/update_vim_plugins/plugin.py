@@ -1,33 +1,278 @@
+import functools
 import logging
 import os
-import urllib
+import random
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
-from datetime import datetime, date
+from requests.adapters import HTTPAdapter
+from datetime import datetime, date, timedelta
 import jsonpickle
-from datetime import datetime
-from dateparser import parse
 
+from .cache import CACHE_DIR, JsonCache
 from .nix import GitSource, License, Source, UrlSource
 from .spec import PluginSpec, RepositoryHost
 
 
 logger = logging.getLogger(__name__)
 
+# Upper bound for API requests in flight to one host. The update command fans out over a thread pool,
+# this keeps the number of parallel calls to the repository hosts below their abuse limits.
+MAX_CONCURRENT_REQUESTS = 10
+
+# Below this share of the rate limit, the limiter starts spreading the remaining requests until the reset
+LOW_QUOTA_FRACTION = 0.2
+
+
+class RequestLimiter:
+    """Limits the number of API requests in flight to one host."""
+
+    def __init__(self, max_concurrent: int) -> None:
+        """Initialize a RequestLimiter."""
+        self.max_concurrent = max_concurrent
+        self.limit = max_concurrent
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    def __exit__(self, *exc_info):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    def update(self, headers, request_time: float) -> None:
+        """Called after every response. The limit of a plain RequestLimiter is fixed."""
+
+
+class AdaptiveLimiter(RequestLimiter):
+    """Limits the number of GitHub API requests in flight.
+
+    The limit starts at max_concurrent and is lowered when GitHub reports that the rate limit is running low:
+    it is sized so that the remaining quota lasts until the reset, given the average request time.
+    """
+
+    def __init__(self, max_concurrent: int) -> None:
+        """Initialize an AdaptiveLimiter."""
+        super().__init__(max_concurrent)
+        self.avg_request_time = 1.0
+
+    def update(self, headers, request_time: float) -> None:
+        """Adjust the limit to the rate limit headers of a response."""
+        try:
+            remaining = int(headers["X-RateLimit-Remaining"])
+            reset = int(headers["X-RateLimit-Reset"])
+            quota = int(headers["X-RateLimit-Limit"])
+        except (KeyError, ValueError):
+            return
+
+        with self._condition:
+            self.avg_request_time = 0.8 * self.avg_request_time + 0.2 * request_time
+
+            if remaining > quota * LOW_QUOTA_FRACTION:
+                limit = self.max_concurrent
+            else:
+                # requests a single slot makes until the reset
+                requests_per_slot = max(1, int((reset - time.time()) / self.avg_request_time))
+                limit = min(self.max_concurrent, max(1, remaining // requests_per_slot))
+
+            if limit != self.limit:
+                logger.info(f"API rate limit: {remaining} requests remaining, limiting to {limit} parallel requests")
+                self.limit = limit
+                self._condition.notify_all()
+
+
+def _make_session() -> requests.Session:
+    """Create a session that keeps its connections to an API host alive between calls.
+
+    The pool holds one connection per request that can be in flight, so none are dropped after use.
+    """
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_maxsize=MAX_CONCURRENT_REQUESTS))
+    return session
+
+
+# one session per host, shared by all worker threads
+_GH_SESSION = _make_session()
+_GL_SESSION = _make_session()
+_SH_SESSION = _make_session()
+
+# Each host has its own quota, so each gets its own limiter. Only GitHub reports its rate limit in the headers.
+_GH_LIMITER = AdaptiveLimiter(MAX_CONCURRENT_REQUESTS)
+_GL_LIMITER = RequestLimiter(MAX_CONCURRENT_REQUESTS)
+_SH_LIMITER = RequestLimiter(MAX_CONCURRENT_REQUESTS)
+
+# Longest we are willing to wait for a rate limit to reset. Beyond that the call fails and the update
+# command falls back to the information stored in .plugins.json
+MAX_RATE_LIMIT_WAIT = 300
+
+
+def _rate_limit_reset_delay(headers) -> float | None:
+    """Return the number of seconds until GitHub's rate limit resets, or None if that is too long to wait."""
+    delay = int(headers.get("X-RateLimit-Reset", 0)) - time.time() + 1
+    return max(delay, 1) if delay <= MAX_RATE_LIMIT_WAIT else None
+
+
+def _retry_delay(response: requests.Response, attempt: int) -> float | None:
+    """Return the number of seconds to wait before retrying, or None if the response is final."""
+    headers = response.headers
+
+    if response.status_code in (403, 429) and headers.get("X-RateLimit-Remaining") == "0":
+        # GitHub: primary rate limit exhausted, wait for the reset
+        return _rate_limit_reset_delay(headers)
+
+    if response.status_code in (403, 429) or response.status_code >= 500:
+        retry_after = headers.get("Retry-After")
+        if retry_after is not None and retry_after.isdigit():
+            return int(retry_after) if int(retry_after) <= MAX_RATE_LIMIT_WAIT else None
+        if response.status_code == 403:
+            return None  # forbidden, not throttled
+        return min(60, 2**attempt + random.uniform(0, 1))
+
+    return None
+
+
+# (connect, read) timeout in seconds. Without it requests waits forever on a host that stops responding,
+# and the request would keep its limiter slot the whole time
+REQUEST_TIMEOUT = (10, 30)
+
+
+def _request_with_retry(
+    session: requests.Session, limiter: RequestLimiter, method: str, url: str, max_attempts: int = 8, **kwargs
+) -> requests.Response:
+    """Send a request. Retry with exponential backoff on rate limits, server errors, connection errors and timeouts."""
+    attempt = 0
+    while True:
+        last_attempt = attempt == max_attempts - 1
+        try:
+            with limiter:
+                start = time.monotonic()
+                response = session.request(method, url, timeout=REQUEST_TIMEOUT, **kwargs)
+                limiter.update(response.headers, time.monotonic() - start)
+        except (requests.ConnectionError, requests.Timeout):
+            if last_attempt:
+                raise
+            delay = min(60, 2**attempt + random.uniform(0, 1))
+        else:
+            delay = _retry_delay(response, attempt)
+            if delay is None or last_attempt:
+                return response
+
+        logger.info(f"Retrying {url} in {delay:.1f}s (attempt {attempt + 1}/{max_attempts})")
+        time.sleep(delay)
+        attempt += 1
+
+
+def _concurrently(*calls):
+    """Run independent API calls in parallel and return their results in the given order."""
+    with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+        futures = [executor.submit(call) for call in calls]
+        return [future.result() for future in futures]
+
+
+# url -> validators and body of the last response, used for conditional requests
+_etag_cache = JsonCache(os.path.join(CACHE_DIR, "etags.json"))
+
+# The parts of the API responses that the plugin constructors read. Only these are kept in the etag cache,
+# full responses (e.g. the diffs in GitHub's commit endpoint) would make it grow without bound.
+# None keeps the value as is, a dict selects nested fields, a list keeps the first element of a list.
+_CACHED_FIELDS = {
+    # GitHub and Gitlab repository info
+    "description": None,
+    "html_url": None,
+    "web_url": None,
+    "license": None,
+    "default_branch": None,
+    # GitHub commit and Gitlab branch
+    "sha": None,
+    "commit": {"id": None, "created_at": None, "committer": {"date": None}},
+    # SourceHut log
+    "results": [{"id": None, "timestamp": None}],
+}
+
+
+def _select_fields(data, fields):
+    """Return the parts of data selected by fields, see _CACHED_FIELDS."""
+    if fields is None:
+        return data
+    if isinstance(fields, list):
+        return [_select_fields(item, fields[0]) for item in data[:1]] if isinstance(data, list) else data
+    if not isinstance(data, dict):
+        return data
+    return {key: _select_fields(data[key], subfields) for key, subfields in fields.items() if key in data}
+
+
+def _get_json(session: requests.Session, limiter: RequestLimiter, url: str, headers: dict, api_name: str) -> dict:
+    """GET url and return the fields of the decoded json response that are listed in _CACHED_FIELDS.
+
+    Responses with an ETag or Last-Modified header are cached. Later calls send a conditional request
+    and reuse the cached body on 304 Not Modified, which does not count against GitHub's rate limit.
+    """
+    headers = dict(headers)
+    cached = _etag_cache.get(url)
+    if cached is not None:
+        if cached["etag"] is not None:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"] is not None:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    response = _request_with_retry(session, limiter, "GET", url, headers=headers)
+
+    if response.status_code == 304 and cached is not None:
+        return cached["body"]
+    if response.status_code != 200:
+        raise RuntimeError(f"{api_name} API call failed: {response.text}")
+
+    body = _select_fields(response.json(), _CACHED_FIELDS)
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if etag is not None or last_modified is not None:
+        _etag_cache.set(url, {"etag": etag, "last_modified": last_modified, "body": body})
+    return body
+
+
+_NIX_TEMPLATE = """
+            /* Generated from: {id} */
+            {name} = {warning} buildVimPlugin {{
+                pname = "{name}";
+                version = "{version}";
+                src = {src};
+                meta = with lib; {{ description = "{description}"; homepage = "{homepage}"; license = with licenses; [ {license} ]; }};
+            }};
+        """
+
 
 class VimPlugin:
     """Abstract base class for vim plugins."""
 
+    __slots__ = (
+        "name",
+        "owner",
+        "repo",
+        "version",
+        "source",
+        "description",
+        "homepage",
+        "license",
+        "warning",
+        "source_line",  # only set on old .plugins.json entries
+    )
+
     name: str
     owner: str
     repo: str
     version: date
     source: Source
-    description: str = "No description"
+    description: str
     homepage: str
     license: License
-    checked: date = datetime.now().date()
-    warning: str | None = None
+    warning: str | None
 
     @property
     def id(self) -> str:
@@ -37,34 +282,35 @@ class VimPlugin:
         return f"{self.owner}/{self.repo}"
 
     def to_nix(self):
-        """Return the nix expression for this plugin."""
-        meta = f'with lib; {{ description = "{self.description}"; homepage = "{self.homepage}"; license = with licenses; [ {self.license.value} ]; }}'
-
-        if self.warning:
+        """Return the nix expression for this plugin. Callers collect these and join them once."""
+        # older .plugins.json entries were stored without a warning
+        if getattr(self, "warning", None):
             warning = f"lib.warn \"Warning for '{self.name}': {self.warning}\""
         else:
             warning = ""
 
-        return f'''
-            /* Generated from: {self.id} */
-            {self.name} = {warning} buildVimPlugin {{
-                pname = "{self.name}";
-                version = "{self.version}";
-                src = {self.source.get_nix_expression()};
-                meta = {meta};
-            }};
-        '''
+        return _NIX_TEMPLATE.format(
+            id=self.id,
+            name=self.name,
+            warning=warning,
+            version=self.version,
+            src=self.source.get_nix_expression(),
+            description=self.description,
+            homepage=self.homepage,
+            license=self.license.value,
+        )
 
     def to_json(self):
         """Serizalize the plugin to json"""
         return jsonpickle.encode(self)
 
     def to_markdown(self):
+        """Return the row for this plugin in plugins.md. Callers collect these and join them once."""
         link = f"[{self.id}]({self.homepage})"
         version = f"{self.version}"
         package_name = f"{self.name}"
 
-        warning = f"{self.warning or ''}"
+        warning = f"{getattr(self, 'warning', None) or ''}"
 
         return f"| {link} | {version} | `{package_name}` | {warning}"
 
@@ -86,57 +332,144 @@ def _get_github_token():
     return token
 
 
+# read once, so the warning is only logged once per run
+_GITHUB_TOKEN = _get_github_token()
+
+
+# Repository metadata and the latest commit in a single round trip.
+# 'expression' is the branch to follow, or HEAD for the default branch.
+_GITHUB_REPOSITORY_QUERY = """
+query($owner: String!, $name: String!, $expression: String!) {
+  repository(owner: $owner, name: $name) {
+    description
+    url
+    licenseInfo { spdxId }
+    object(expression: $expression) { ... on Commit { oid committedDate } }
+  }
+}
+"""
+
+
 class GitHubPlugin(VimPlugin):
+    __slots__ = ()
+
     def __init__(self, plugin_spec: PluginSpec) -> None:
         """Initialize a GitHubPlugin."""
 
         owner = plugin_spec.owner
         repo = plugin_spec.repo
         full_name = f"{owner}/{repo}"
-        repo_info = self._api_call(f"repos/{full_name}")
-        default_branch = plugin_spec.branch or repo_info["default_branch"]
-        api_callback = self._api_call(f"repos/{full_name}/commits/{default_branch}")
-        latest_commit = api_callback["commit"]
-        sha = api_callback["sha"]
+
+        if _GITHUB_TOKEN is not None:
+            repo_info = self._graphql(
+                _GITHUB_REPOSITORY_QUERY,
+                {"owner": owner, "name": repo, "expression": plugin_spec.branch or "HEAD"},
+            )["repository"]
+            if repo_info is None or repo_info["object"] is None:
+                raise RuntimeError(f"GitHub API call failed: could not resolve {full_name}")
+            sha = repo_info["object"]["oid"]
+            commit_date = repo_info["object"]["committedDate"]
+            homepage = repo_info["url"]
+            spdx_id = (repo_info.get("licenseInfo") or {}).get("spdxId")
+        else:
+            # the GraphQL API cannot be used anonymously
+            if plugin_spec.branch:
+                repo_info, api_callback = _concurrently(
+                    lambda: self._api_call(f"repos/{full_name}"),
+                    lambda: self._api_call(f"repos/{full_name}/commits/{plugin_spec.branch}"),
+                )
+            else:
+                repo_info = self._api_call(f"repos/{full_name}")
+                api_callback = self._api_call(f"repos/{full_name}/commits/{repo_info['default_branch']}")
+            sha = api_callback["sha"]
+            commit_date = api_callback["commit"]["committer"]["date"]
+            homepage = repo_info["html_url"]
+            spdx_id = (repo_info.get("license") or {}).get("spdx_id")
 
         self.name = plugin_spec.name
         self.repo = repo
         self.owner = owner
-        self.version = parse(latest_commit["committer"]["date"]).date()
+        self.version = date.fromisoformat(commit_date[:10])
         self.source = UrlSource(f"https://github.com/{full_name}/archive/{sha}.tar.gz")
         self.description = (repo_info.get("description") or "").replace('"', '\\"')
-        self.homepage = repo_info["html_url"]
-        self.license = plugin_spec.license or License.from_spdx_id((repo_info.get("license") or {}).get("spdx_id"))
+        self.homepage = homepage
+        self.license = plugin_spec.license or License.from_spdx_id(spdx_id)
         self.warning = plugin_spec.warning
 
-    def _api_call(self, path: str, token: str | None = _get_github_token()):
-        """Call the GitHub API."""
+    def _api_call(self, path: str, token: str | None = None):
+        """Call the GitHub REST API."""
+        token = token if token is not None else _GITHUB_TOKEN
         url = f"https://api.github.com/{path}"
         headers = {"Content-Type": "application/json"}
         if token is not None:
             headers["Authorization"] = f"token {token}"
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            raise RuntimeError(f"GitHub API call failed: {response.text}")
-        return response.json()
+        return _get_json(_GH_SESSION, _GH_LIMITER, url, headers, "GitHub")
+
+    def _graphql(self, query: str, variables: dict, token: str | None = None, max_attempts: int = 8) -> dict:
+        """Call the GitHub GraphQL API. Requires a token.
+
+        An exhausted rate limit is reported with status 200 and a RATE_LIMITED error. In that case
+        we wait for the reset (at most MAX_RATE_LIMIT_WAIT) and try again.
+        """
+        token = token if token is not None else _GITHUB_TOKEN
+        url = "https://api.github.com/graphql"
+        headers = {"Content-Type": "application/json", "Authorization": f"bearer {token}"}
+
+        for attempt in range(max_attempts):
+            response = _request_with_retry(
+                _GH_SESSION, _GH_LIMITER, "POST", url, headers=headers, json={"query": query, "variables": variables}
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"GitHub API call failed: {response.text}")
+            result = response.json()
+            errors = result.get("errors")
+            if not errors:
+                return result["data"]
+
+            rate_limited = (
+                any(error.get("type") == "RATE_LIMITED" for error in errors)
+                or response.headers.get("X-RateLimit-Remaining") == "0"
+            )
+            delay = _rate_limit_reset_delay(response.headers) if rate_limited else None
+            if delay is None or attempt == max_attempts - 1:
+                raise RuntimeError(f"GitHub API call failed: {errors}")
+
+            logger.info(f"GitHub GraphQL rate limit reached, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+_GITLAB_API = "https://gitlab.com/api/v4"
+
+
+@functools.lru_cache(maxsize=None)
+def _gitlab_project_path(owner: str, repo: str) -> str:
+    """Return the api path of a Gitlab project, which is addressed by its url-encoded full name."""
+    return "projects/" + urllib.parse.quote(f"{owner}/{repo}", safe="")
 
 
 class GitlabPlugin(VimPlugin):
+    __slots__ = ()
+
     def __init__(self, plugin_spec: PluginSpec) -> None:
         """Initialize a GitlabPlugin."""
 
-        full_name = urllib.parse.quote(f"{plugin_spec.owner}/{plugin_spec.repo}", safe="")
-        repo_info = self._api_call(f"projects/{full_name}")
-        default_branch = plugin_spec.branch or repo_info["default_branch"]
-        api_callback = self._api_call(f"projects/{full_name}/repository/branches/{default_branch}")
+        project = _gitlab_project_path(plugin_spec.owner, plugin_spec.repo)
+        if plugin_spec.branch:
+            repo_info, api_callback = _concurrently(
+                lambda: self._api_call(project),
+                lambda: self._api_call(f"{project}/repository/branches/{plugin_spec.branch}"),
+            )
+        else:
+            repo_info = self._api_call(project)
+            api_callback = self._api_call(f"{project}/repository/branches/{repo_info['default_branch']}")
         latest_commit = api_callback["commit"]
         sha = latest_commit["id"]
 
         self.name = plugin_spec.name # TODO: use info from api_call to auto update when repos are renamed
         self.repo = plugin_spec.repo
         self.owner = plugin_spec.owner
-        self.version = parse(latest_commit["created_at"]).date()
-        self.source = UrlSource(f"https://gitlab.com/api/v4/projects/{full_name}/repository/archive.tar.gz?sha={sha}")
+        self.version = date.fromisoformat(latest_commit["created_at"][:10])
+        self.source = UrlSource(f"{_GITLAB_API}/{project}/repository/archive.tar.gz?sha={sha}")
         self.description = (repo_info.get("description") or "").replace('"', '\\"')
         self.homepage = repo_info["web_url"]
         self.license = plugin_spec.license or License.from_spdx_id(repo_info.get("license", {}).get("key"))
@@ -144,11 +477,8 @@ class GitlabPlugin(VimPlugin):
 
     def _api_call(self, path: str) -> dict:
         """Call the Gitlab API."""
-        url = f"https://gitlab.com/api/v4/{path}"
-        response = requests.get(url)
-        if response.status_code != 200:
-            raise RuntimeError(f"Gitlab API call failed: {response.text}")
-        return response.json()
+        url = f"{_GITLAB_API}/{path}"
+        return _get_json(_GL_SESSION, _GL_LIMITER, url, {}, "Gitlab")
 
 
 def _get_sourcehut_token():
@@ -158,48 +488,90 @@ def _get_sourcehut_token():
     return token
 
 
+_SOURCEHUT_TOKEN = _get_sourcehut_token()
+
+
 class SourceHutPlugin(VimPlugin):
+    __slots__ = ()
+
     def __init__(self, plugin_spec: PluginSpec) -> None:
         """Initialize a SourceHutPlugin."""
 
-        repo_info = self._api_call(f"~{plugin_spec.owner}/repos/{plugin_spec.repo}")
-        if plugin_spec.branch is None:
-            commits = self._api_call(f"~{plugin_spec.owner}/repos/{plugin_spec.repo}/log")
-        else:
-            commits = self._api_call(f"~{plugin_spec.owner}/repos/{plugin_spec.repo}/log/{plugin_spec.branch}")
+        # the commit log does not depend on the repo info, so both are fetched at the same time
+        log_path = f"log/{plugin_spec.branch}" if plugin_spec.branch else "log"
+        repo_info, commits = _concurrently(
+            lambda: self._api_call(f"~{plugin_spec.owner}/repos/{plugin_spec.repo}"),
+            lambda: self._api_call(f"~{plugin_spec.owner}/repos/{plugin_spec.repo}/{log_path}"),
+        )
         latest_commit = commits["results"][0]
         sha = latest_commit["id"]
 
         self.name = plugin_spec.name
         self.repo = plugin_spec.repo
         self.owner = plugin_spec.owner
-        self.version = parse(latest_commit["timestamp"]).date()
+        self.version = date.fromisoformat(latest_commit["timestamp"][:10])
         self.description = (repo_info.get("description") or "").replace('"', '\\"')
         self.homepage = f"https://git.sr.ht/~{plugin_spec.owner}/{plugin_spec.repo}"
         self.source = GitSource(self.homepage, sha)
         self.license = plugin_spec.license or License.UNKNOWN  # cannot be determined via API
+        self.warning = plugin_spec.warning
 
-    def _api_call(self, path: str, token: str | None = _get_sourcehut_token()):
+    def _api_call(self, path: str, token: str | None = None):
         """Call the SourceHut API."""
+        token = token if token is not None else _SOURCEHUT_TOKEN
 
         url = f"https://git.sr.ht/api/{path}"
         headers = {"Content-Type": "application/json"}
         if token is not None:
             headers["Authorization"] = f"token {token}"
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            raise RuntimeError(f"SourceHut API call failed: {response.json()}")
-        return response.json()
-
-
-def plugin_from_spec(plugin_spec: PluginSpec) -> VimPlugin:
-    """Initialize a VimPlugin."""
-
-    if plugin_spec.repository_host == RepositoryHost.GITHUB:
-        return GitHubPlugin(plugin_spec)
-    elif plugin_spec.repository_host == RepositoryHost.GITLAB:
-        return GitlabPlugin(plugin_spec)
-    elif plugin_spec.repository_host == RepositoryHost.SOURCEHUT:
-        return SourceHutPlugin(plugin_spec)
-    else:
+        return _get_json(_SH_SESSION, _SH_LIMITER, url, headers, "SourceHut")
+
+
+# Plugins fetched within this time are served from the cache instead of asking the APIs again
+PLUGIN_CACHE_TTL = timedelta(hours=6)
+
+# spec key -> time of the last fetch and the serialized plugin
+_plugin_cache = JsonCache(os.path.join(CACHE_DIR, "plugins.json"))
+
+
+def _plugin_cache_key(plugin_spec: PluginSpec) -> str:
+    # the license override is baked into the cached plugin, so changing it must invalidate the entry
+    license = plugin_spec.license.value if plugin_spec.license else ""
+    return f"{plugin_spec.repository_host}:{plugin_spec.owner}/{plugin_spec.repo}:{plugin_spec.branch or ''}:{license}"
+
+
+def plugin_from_spec(plugin_spec: PluginSpec, force_refresh: bool = False) -> VimPlugin:
+    """Initialize a VimPlugin. Reuses a recent result from the plugin cache unless force_refresh is set."""
+
+    key = _plugin_cache_key(plugin_spec)
+
+    if not force_refresh:
+        cached = _plugin_cache.get(key)
+        if cached is not None and datetime.now() - datetime.fromisoformat(cached["checked"]) < PLUGIN_CACHE_TTL:
+            plugin = jsonpickle.decode(cached["plugin"])
+            # these come from the manifest and may have changed since the plugin was cached
+            plugin.name = plugin_spec.name
+            plugin.warning = plugin_spec.warning
+            return plugin
+
+    plugin = _fetch_plugin(plugin_spec)
+    _plugin_cache.set(key, {"checked": datetime.now().isoformat(), "plugin": plugin.to_json()})
+
+    return plugin
+
+
+_HOST_CLS: dict[RepositoryHost, type[VimPlugin]] = {
+    RepositoryHost.GITHUB: GitHubPlugin,
+    RepositoryHost.GITLAB: GitlabPlugin,
+    RepositoryHost.SOURCEHUT: SourceHutPlugin,
+}
+
+
+def _fetch_plugin(plugin_spec: PluginSpec) -> VimPlugin:
+    """Fetch the plugin information from its repository host."""
+
+    cls = _HOST_CLS.get(plugin_spec.repository_host)
+    if cls is None:
         raise NotImplementedError(f"Unsupported source: {plugin_spec.repository_host}")
+
+    return cls(plugin_spec)
@@ -1,14 +1,36 @@
 import json
+from datetime import date
 from typing import Callable
 
 import pytest
+import requests
 from pytest_mock import MockFixture
 
-from update_vim_plugins.nix import License, Source, UrlSource
-from update_vim_plugins.plugin import GitHubPlugin, VimPlugin
+from update_vim_plugins.cache import JsonCache
+from update_vim_plugins.nix import GitSource, License, Source, UrlSource
+from update_vim_plugins.plugin import (
+    _CACHED_FIELDS,
+    REQUEST_TIMEOUT,
+    AdaptiveLimiter,
+    GitHubPlugin,
+    RequestLimiter,
+    SourceHutPlugin,
+    VimPlugin,
+    _get_json,
+    _request_with_retry,
+    _select_fields,
+    plugin_from_spec,
+)
 from update_vim_plugins.spec import PluginSpec
 
-from .fixtures import sha256, url, url_source
+from .fixtures import git_source, rev, sha256, url, url_source
+
+
+@pytest.fixture(autouse=True)
+def caches(mocker: MockFixture, tmp_path):
+    """Keep the tests away from the caches in the user's cache directory."""
+    mocker.patch("update_vim_plugins.plugin._etag_cache", JsonCache(str(tmp_path / "etags.json")))
+    mocker.patch("update_vim_plugins.plugin._plugin_cache", JsonCache(str(tmp_path / "plugins.json")))
 
 
 @pytest.fixture()
@@ -45,9 +67,14 @@ def test_vim_plugin_nix_expression(mock_plugin):
 
 
 class MockResponse:
-    def __init__(self, status_code: int, content: bytes):
+    def __init__(self, status_code: int, content: bytes, headers: dict | None = None):
         self.status_code = status_code
         self.content = content
+        self.headers = headers or {}
+
+    @property
+    def text(self):
+        return self.content.decode()
 
     def json(self):
         return json.loads(self.content)
@@ -56,12 +83,25 @@ class MockResponse:
 def mock_request_get(repsonses: dict[str, MockResponse]):
     respones_not_found = MockResponse(404, b'{"message": "Not Found"}')
 
-    def mock_get(url: str, *args, **kwargs):
+    def mock_get(method: str, url: str, *args, **kwargs):
+        if method != "GET":
+            return respones_not_found
         return repsonses.get(url, respones_not_found)
 
     return mock_get
 
 
+def mock_request_post(repsonses: dict[str, MockResponse]):
+    respones_not_found = MockResponse(404, b'{"message": "Not Found"}')
+
+    def mock_post(method: str, url: str, *args, **kwargs):
+        if method != "POST":
+            return respones_not_found
+        return repsonses.get(url, respones_not_found)
+
+    return mock_post
+
+
 @pytest.fixture()
 def github_commits_response():
     return MockResponse(
@@ -122,25 +162,267 @@ def github_get_no_license(github_commits_response: MockResponse):
     return mock_request_get(responses)
 
 
+@pytest.fixture()
+def github_graphql_post():
+    graphql_response = MockResponse(
+        200,
+        json.dumps(
+            {
+                "data": {
+                    "repository": {
+                        "description": "This your first repo!",
+                        "url": "https://github.com/octocat/Hello-World",
+                        "licenseInfo": {
+                            "spdxId": "MIT",
+                        },
+                        "object": {
+                            "oid": "6dcb09b5b57875f334f61aebed695e2e4193db5e",
+                            "committedDate": "2011-04-14T16:00:49Z",
+                        },
+                    }
+                }
+            }
+        ),
+    )
+    responses = {
+        "https://api.github.com/graphql": graphql_response,
+    }
+    return mock_request_post(responses)
+
+
 def test_github_plugin(mocker: MockFixture, github_get: Callable, url_source: UrlSource):
-    mocker.patch("requests.get", github_get)
+    mocker.patch("update_vim_plugins.plugin._GITHUB_TOKEN", None)
+    mocker.patch("update_vim_plugins.plugin._GH_SESSION.request", github_get)
     url_source = mocker.patch("update_vim_plugins.nix.UrlSource", url_source)
 
     spec = PluginSpec.from_spec("octocat/Hello-World")
     plugin = GitHubPlugin(spec)
 
     assert plugin.name == "Hello-World"
-    assert plugin.version == "2011-04-14"
+    assert plugin.version == date(2011, 4, 14)
     assert plugin.description == "This your first repo!"
     assert plugin.homepage == "https://github.com/octocat/Hello-World"
     assert plugin.license == License.MIT
 
 
 def test_github_plugin_no_license(mocker: MockFixture, github_get_no_license: Callable, url_source: UrlSource):
-    mocker.patch("requests.get", github_get_no_license)
+    mocker.patch("update_vim_plugins.plugin._GITHUB_TOKEN", None)
+    mocker.patch("update_vim_plugins.plugin._GH_SESSION.request", github_get_no_license)
     url_source = mocker.patch("update_vim_plugins.nix.UrlSource", url_source)
 
     spec = PluginSpec.from_spec("octocat/Hello-World")
     plugin = GitHubPlugin(spec)
 
     assert plugin.license == License.UNKNOWN
+
+
+def test_github_plugin_graphql(mocker: MockFixture, github_graphql_post: Callable, url_source: UrlSource):
+    mocker.patch("update_vim_plugins.plugin._GITHUB_TOKEN", "token")
+    request = mocker.patch("update_vim_plugins.plugin._GH_SESSION.request", side_effect=github_graphql_post)
+
+    spec = PluginSpec.from_spec("octocat/Hello-World")
+    plugin = GitHubPlugin(spec)
+
+    assert plugin.name == "Hello-World"
+    assert plugin.version == date(2011, 4, 14)
+    assert plugin.description == "This your first repo!"
+    assert plugin.homepage == "https://github.com/octocat/Hello-World"
+    assert plugin.license == License.MIT
+    assert plugin.source.url == (
+        "https://github.com/octocat/Hello-World/archive/6dcb09b5b57875f334f61aebed695e2e4193db5e.tar.gz"
+    )
+    assert request.call_count == 1
+    # a hung request must not hold the GitHub limiter slot forever
+    assert request.call_args.kwargs["timeout"] == REQUEST_TIMEOUT
+
+
+def test_get_json_conditional_request(mocker: MockFixture):
+    url = "https://api.github.com/repos/octocat/Hello-World"
+    session = mocker.Mock()
+    session.request.return_value = MockResponse(200, b'{"description": "Hello"}', {"ETag": '"abc"'})
+
+    assert _get_json(session, RequestLimiter(1), url, {}, "GitHub") == {"description": "Hello"}
+
+    session.request.return_value = MockResponse(304, b"")
+
+    assert _get_json(session, RequestLimiter(1), url, {}, "GitHub") == {"description": "Hello"}
+    session.request.assert_called_with("GET", url, timeout=REQUEST_TIMEOUT, headers={"If-None-Match": '"abc"'})
+
+
+def test_get_json_selects_fields():
+    commit = {
+        "sha": "6dcb09b5b57875f334f61aebed695e2e4193db5e",
+        "commit": {"committer": {"date": "2011-04-14T16:00:49Z", "name": "Monalisa"}, "message": "Fix all the bugs"},
+        "files": [{"filename": "file1.txt", "patch": "@@ -29,7 +29,7 @@"}],
+    }
+    log = {"results": [{"id": "1", "timestamp": "2023-05-01T10:00:00+00:00", "message": "m"}, {"id": "2"}]}
+
+    assert _select_fields(commit, _CACHED_FIELDS) == {
+        "sha": "6dcb09b5b57875f334f61aebed695e2e4193db5e",
+        "commit": {"committer": {"date": "2011-04-14T16:00:49Z"}},
+    }
+    assert _select_fields(log, _CACHED_FIELDS) == {"results": [{"id": "1", "timestamp": "2023-05-01T10:00:00+00:00"}]}
+
+
+def test_request_with_retry_server_error(mocker: MockFixture):
+    sleep = mocker.patch("time.sleep")
+    session = mocker.Mock()
+    session.request.side_effect = [MockResponse(502, b"Bad Gateway"), MockResponse(200, b"{}")]
+
+    response = _request_with_retry(session, RequestLimiter(1), "GET", "https://api.github.com/")
+
+    assert response.status_code == 200
+    assert session.request.call_count == 2
+    sleep.assert_called_once()
+
+
+def test_request_with_retry_timeout(mocker: MockFixture):
+    sleep = mocker.patch("time.sleep")
+    session = mocker.Mock()
+    session.request.side_effect = [requests.Timeout(), MockResponse(200, b"{}")]
+
+    response = _request_with_retry(session, RequestLimiter(1), "GET", "https://api.github.com/")
+
+    assert response.status_code == 200
+    assert session.request.call_count == 2
+    session.request.assert_called_with("GET", "https://api.github.com/", timeout=REQUEST_TIMEOUT)
+    sleep.assert_called_once()
+
+
+def test_request_with_retry_rate_limit(mocker: MockFixture):
+    sleep = mocker.patch("time.sleep")
+    mocker.patch("time.time", return_value=1000)
+    session = mocker.Mock()
+    rate_limited = MockResponse(403, b"", {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "1010"})
+    session.request.side_effect = [rate_limited, MockResponse(200, b"{}")]
+
+    response = _request_with_retry(session, RequestLimiter(1), "GET", "https://api.github.com/")
+
+    assert response.status_code == 200
+    sleep.assert_called_once_with(11)
+
+
+def test_graphql_rate_limit(mocker: MockFixture):
+    sleep = mocker.patch("time.sleep")
+    mocker.patch("time.time", return_value=1000)
+    mocker.patch("update_vim_plugins.plugin._GITHUB_TOKEN", "token")
+    rate_limited = MockResponse(
+        200,
+        json.dumps({"errors": [{"type": "RATE_LIMITED", "message": "API rate limit exceeded"}]}).encode(),
+        {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "1010"},
+    )
+    success = MockResponse(200, json.dumps({"data": {"repository": None}}).encode())
+    request = mocker.patch("update_vim_plugins.plugin._GH_SESSION.request", side_effect=[rate_limited, success])
+
+    plugin = GitHubPlugin.__new__(GitHubPlugin)
+    data = plugin._graphql("query", {})
+
+    assert data == {"repository": None}
+    assert request.call_count == 2
+    sleep.assert_called_once_with(11)
+
+
+def test_graphql_rate_limit_too_long(mocker: MockFixture):
+    sleep = mocker.patch("time.sleep")
+    mocker.patch("time.time", return_value=1000)
+    mocker.patch("update_vim_plugins.plugin._GITHUB_TOKEN", "token")
+    rate_limited = MockResponse(
+        200,
+        json.dumps({"errors": [{"type": "RATE_LIMITED", "message": "API rate limit exceeded"}]}).encode(),
+        {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "4600"},
+    )
+    mocker.patch("update_vim_plugins.plugin._GH_SESSION.request", return_value=rate_limited)
+
+    plugin = GitHubPlugin.__new__(GitHubPlugin)
+    with pytest.raises(RuntimeError, match="GitHub API call failed"):
+        plugin._graphql("query", {})
+
+    sleep.assert_not_called()
+
+
+def test_request_with_retry_gives_up(mocker: MockFixture):
+    mocker.patch("time.sleep")
+    session = mocker.Mock()
+    session.request.return_value = MockResponse(503, b"")
+
+    response = _request_with_retry(session, RequestLimiter(1), "GET", "https://api.github.com/", max_attempts=3)
+
+    assert response.status_code == 503
+    assert session.request.call_count == 3
+
+
+def test_plugin_from_spec_cached(mocker: MockFixture, github_get: Callable, url_source: UrlSource):
+    mocker.patch("update_vim_plugins.plugin._GITHUB_TOKEN", None)
+    request = mocker.patch("update_vim_plugins.plugin._GH_SESSION.request", side_effect=github_get)
+
+    spec = PluginSpec.from_spec("octocat/Hello-World")
+    plugin = plugin_from_spec(spec)
+    calls = request.call_count
+
+    cached_plugin = plugin_from_spec(spec)
+    assert request.call_count == calls
+    assert cached_plugin.version == plugin.version
+    assert cached_plugin.source.url == plugin.source.url
+
+    plugin_from_spec(spec, force_refresh=True)
+    assert request.call_count == 2 * calls
+
+
+def test_plugin_from_spec_cached_license_override(
+    mocker: MockFixture, github_get: Callable, url_source: UrlSource
+):
+    mocker.patch("update_vim_plugins.plugin._GITHUB_TOKEN", None)
+    mocker.patch("update_vim_plugins.plugin._GH_SESSION.request", side_effect=github_get)
+
+    spec = PluginSpec.from_yaml({"owner": "octocat", "repo": "Hello-World", "license": "gpl3Only"})
+    assert plugin_from_spec(spec).license == License.GPL_3_0
+
+    # override removed from the manifest: the license from the API applies again
+    spec = PluginSpec.from_yaml({"owner": "octocat", "repo": "Hello-World"})
+    assert plugin_from_spec(spec).license == License.MIT
+
+
+def test_sourcehut_plugin(mocker: MockFixture, git_source: GitSource):
+    responses = {
+        "https://git.sr.ht/api/~owner/repos/repo": MockResponse(200, b'{"description": "A \\"quoted\\" repo"}'),
+        "https://git.sr.ht/api/~owner/repos/repo/log": MockResponse(
+            200, b'{"results": [{"id": "1234567890abcdef", "timestamp": "2023-05-01T10:00:00+00:00"}]}'
+        ),
+    }
+    mocker.patch("update_vim_plugins.plugin._SH_SESSION.request", mock_request_get(responses))
+
+    spec = PluginSpec.from_yaml({"repository_host": "sourcehut", "owner": "owner", "repo": "repo", "warning": "broken"})
+    plugin = SourceHutPlugin(spec)
+
+    assert plugin.version == date(2023, 5, 1)
+    assert plugin.description == 'A \\"quoted\\" repo'
+    assert plugin.homepage == "https://git.sr.ht/~owner/repo"
+    assert plugin.source.rev == "1234567890abcdef"
+    assert plugin.license == License.UNKNOWN
+    assert plugin.warning == "broken"
+
+
+def test_adaptive_limiter(mocker: MockFixture):
+    mocker.patch("time.time", return_value=1000)
+    limiter = AdaptiveLimiter(10)
+    limiter.avg_request_time = 1.0
+
+    limiter.update({"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "4000", "X-RateLimit-Reset": "4600"}, 1.0)
+    assert limiter.limit == 10
+
+    # 500 requests left, 100 seconds until the reset: 5 parallel requests use up the quota just in time
+    limiter.update({"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "500", "X-RateLimit-Reset": "1100"}, 1.0)
+    assert limiter.limit == 5
+
+    limiter.update({"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "10", "X-RateLimit-Reset": "4600"}, 1.0)
+    assert limiter.limit == 1
+
+    limiter.update({}, 1.0)
+    assert limiter.limit == 1
+
+
+def test_request_limiter_ignores_rate_limit_headers():
+    limiter = RequestLimiter(10)
+
+    limiter.update({"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "10", "X-RateLimit-Reset": "4600"}, 1.0)
+    assert limiter.limit == 10
@@ -1,3 +1,4 @@
+import os
 import subprocess
 from random import shuffle
 from cleo.commands.command import Command
@@ -18,6 +19,11 @@ import re
 
 jsonpickle.set_encoder_options('json', sort_keys=True)
 
+# Number of plugins processed in parallel, can be overwritten with VIM_PLUGIN_CONCURRENCY.
+# API requests are additionally bounded by MAX_CONCURRENT_REQUESTS, the remaining workers keep nix-prefetch busy
+# in the meantime
+DEFAULT_WORKERS = 16
+
 
 class UpdateState:
     """Abstract class to combine the three state classes below"""
@@ -43,7 +49,7 @@ class PluginFailure(UpdateState):
 
 class UpdateCommand(Command):
     name = "update"
-    description = "Update plugins. Optional args: 'all', 'dry-run'"
+    description = "Update plugins. Optional args: 'all', 'dry-run', 'force-refresh'"
     options = [
         option(
             "all",
@@ -55,6 +61,11 @@ class UpdateCommand(Command):
             description="Show which plugins would be updated",
             flag=True
         ),
+        option(
+            "force-refresh",
+            description="Ignore cached results and fetch all plugins from their repository hosts",
+            flag=True
+        ),
         option(
             "only",
             description="Only update this plugins",
@@ -68,6 +79,10 @@ class UpdateCommand(Command):
 
         self.specs = read_manifest_yaml_to_spec()
 
+        # parsed once, the workers fall back to it when a plugin cannot be updated
+        with open(JSON_FILE, "r") as json_file:
+            self.plugins_json = json.load(json_file)
+
         if self.option("all"):
             # update all plugins
             spec_list = self.specs
@@ -78,16 +93,13 @@ class UpdateCommand(Command):
             spec_list = []
             known_plugins = []
 
-            with open(JSON_FILE, "r") as json_file:
-                data = json.load(json_file)
-
-                for spec in self.specs:
-                    if spec.id == selected_plugin:
-                        spec_list = [ spec ]
-                    else:
-                        spec_json = data.get(spec.id)
-                        if spec_json is not None: # not all plugins are stored in .plugins.json already
-                            known_plugins.append(jsonpickle.decode(spec_json))
+            for spec in self.specs:
+                if spec.id == selected_plugin:
+                    spec_list = [ spec ]
+                else:
+                    spec_json = self.plugins_json.get(spec.id)
+                    if spec_json is not None: # not all plugins are stored in .plugins.json already
+                        known_plugins.append(jsonpickle.decode(spec_json))
             if spec_list == []:
                 self.line(f"Error: Could not find Plugin: {selected_plugin}.\nUsage: --only <owner>/<repo>")
                 exit()
@@ -96,13 +108,12 @@ class UpdateCommand(Command):
             # filter plugins we already know
             spec_list = self.specs
 
-            with open(JSON_FILE, "r") as json_file:
-                data = json.load(json_file)
+            data = self.plugins_json
 
-                known_specs = list(filter(lambda x: x.id in data, spec_list))
-                known_plugins = [ jsonpickle.decode(data[x.id]) for x in known_specs ]
+            known_specs = list(filter(lambda x: x.id in data, spec_list))
+            known_plugins = [ jsonpickle.decode(data[x.id]) for x in known_specs ]
 
-                spec_list = list(filter(lambda x: x.id not in data, spec_list))
+            spec_list = list(filter(lambda x: x.id not in data, spec_list))
 
         if self.option("dry-run"):
             self.line("<comment>These plugins would be updated</comment>")
@@ -146,10 +157,10 @@ class UpdateCommand(Command):
 
         header = f" - Plugin count: {len(plugins)}\n\n| Repo | Last Update | Nix package name | warnings | \n|:---|:---|:---|:---|\n"
 
+        rows = "".join(f"{plugin.to_markdown()}\n" for plugin in plugins)
+
         with open(PLUGINS_LIST_FILE, "w") as file:
-            file.write(header)
-            for plugin in plugins:
-                file.write(f"{plugin.to_markdown()}\n")
+            file.write(header + rows)
 
 
     def write_plugins(self, plugins):
@@ -203,17 +214,14 @@ class UpdateCommand(Command):
 
         try:
             debug_string += f" - <info>({i+1}/{size}) Processing</info> {spec!r}\n"
-            vim_plugin = plugin_from_spec(spec)
+            vim_plugin = plugin_from_spec(spec, force_refresh=self.option("force-refresh"))
             debug_string += f"   • <comment>Success</comment> {vim_plugin!r}\n"
             ret = PluginUpdated(vim_plugin)
         except Exception as e:
             if str(e).startswith("GitHub API call failed") and re.search("exceeded a secondary rate limit", str(e)):
                 e = Exception("GitHub API rate limit reached")
             debug_string += f"   • <error>Error:</error> Could not update <info>{spec.name}</info>. Keeping old values. Reason: {e}\n"
-            with open(JSON_FILE, "r") as json_file:
-                data = json.load(json_file)
-
-            plugin_json = data.get(spec.id)
+            plugin_json = self.plugins_json.get(spec.id)
             if plugin_json:
                 vim_plugin = jsonpickle.decode(plugin_json)
                 vim_plugin.warning = spec.warning # udpate warning
@@ -236,7 +244,17 @@ class UpdateCommand(Command):
         # not favor those at the start of the list
         shuffle(spec_list)
 
-        with ThreadPoolExecutor() as executor:
+        concurrency = os.environ.get("VIM_PLUGIN_CONCURRENCY", str(DEFAULT_WORKERS))
+        try:
+            max_workers = max(1, int(concurrency))
+        except ValueError:
+            self.line(
+                f"<error>Error:</error> VIM_PLUGIN_CONCURRENCY must be an integer, got '{concurrency}'. "
+                f"Using {DEFAULT_WORKERS}"
+            )
+            max_workers = DEFAULT_WORKERS
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
             futures = [executor.submit(self.generate_plugin, spec, i, size) for i, spec in enumerate(spec_list)]
             results = [future.result() for future in as_completed(futures)]
 